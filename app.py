@@ -7,8 +7,15 @@ import numpy as np
 import seaborn as sns
 import matplotlib.pyplot as plt
 from sklearn.preprocessing import StandardScaler
-from sklearn.cluster import KMeans
+from clustering_engines import fit_engine, get_engine_name
+from projection import fit_projection, project, plot_projection
+from cohorts import (COHORT_FREQUENCIES, MIN_COHORT_SIZE, train_cohort_models, compare_cohorts,
+                     small_windows)
+from drift_monitor import DriftMonitor, MIN_SCORED
+from audit_log import AuditLog, aggregate_predictions, predictions_per_cluster, predictions_per_user
+from stability import N_BOOTSTRAP, get_stability, load_stability, stability_label
 import os
+import hashlib
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -193,8 +200,8 @@ def load_and_preprocess_data():
 # MODEL TRAINING
 # =================================================
 @st.cache_resource
-def train_clustering_model(df):
-    """Train K-Means clustering model"""
+def train_clustering_model(df, engine):
+    """Train K-Means clustering model with the configured engine"""
     try:
         # Define features for clustering
         features = ["Age", "Income", "Total_Spending",
@@ -204,19 +211,50 @@ def train_clustering_model(df):
         # Check if all required features exist
         missing_features = [f for f in features if f not in df.columns]
         if missing_features:
-            return None, None, None, None, f"Missing features in dataset: {missing_features}"
+            return None, None, None, None, None, None, f"Missing features in dataset: {missing_features}"
         
         # Standardize features
         scaler = StandardScaler()
         X_scaled = scaler.fit_transform(df[features])
         
         # Train K-Means model
-        model = KMeans(n_clusters=6, random_state=42, n_init=10)
-        clusters = model.fit_predict(X_scaled)
+        result = fit_engine(engine, X_scaled, n_clusters=6, random_state=42)
+        model, clusters = result["model"], result["labels"]
+        fit_report = {key: result[key] for key in ("engine", "fit_time", "n_iter", "inertia")}
         
-        return model, scaler, features, clusters, None
+        # Fit the 2-D projection once per model and keep it with the model
+        projection = fit_projection(X_scaled, clusters, model.n_clusters)
+        
+        return model, scaler, features, clusters, projection, fit_report, None
     except Exception as e:
-        return None, None, None, None, f"Error training model: {str(e)}"
+        return None, None, None, None, None, None, f"Error training model: {str(e)}"
+
+def get_model_version(model, scaler):
+    """Short content hash identifying a fitted model + scaler"""
+    digest = hashlib.sha1()
+    for array in (model.cluster_centers_, scaler.mean_, scaler.scale_):
+        digest.update(np.ascontiguousarray(array).tobytes())
+    return digest.hexdigest()[:12]
+
+@st.cache_resource
+def train_cohort_segmentation(df, features, freq, engine):
+    """Train per-window cohort models (disk-cached per window)"""
+    return train_cohort_models(df, features, freq=freq, engine=engine)
+
+@st.cache_resource
+def init_drift_monitor(model_version, training_data, _clusters, n_clusters):
+    """Build the drift monitor (shared by all sessions) from the training data
+
+    Keyed on the model version and the feature columns only, so columns added
+    to the dashboard frame later never replace the monitor and its history.
+    """
+    features = list(training_data.columns)
+    return DriftMonitor.from_training(training_data, _clusters, features, n_clusters)
+
+@st.cache_resource
+def get_audit_log(features):
+    """Single background-writer audit log shared by all sessions"""
+    return AuditLog(features)
 
 # =================================================
 # LOGIN PAGE
@@ -297,6 +335,208 @@ def get_cluster_insights(cluster_id, cluster_summary):
     }
     return insights.get(cluster_id, "📊 General Customer Segment")
 
+# =================================================
+# COHORT COMPARISON
+# =================================================
+def display_cohort_comparison(df, features, model, scaler, freq):
+    """Show cluster summaries side by side for each acquisition window"""
+    with st.spinner("🤖 Training cohort models..."):
+        results, error = train_cohort_segmentation(df[features + ["Dt_Customer"]], features, freq,
+                                                   get_engine_name())
+    
+    if error:
+        st.error(error)
+        return
+    
+    comparison = compare_cohorts(results, features, model, scaler)
+    cached = sum(1 for entry in results.values() if entry["from_cache"])
+    skipped = small_windows(df, freq)
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Windows", len(results))
+    with col2:
+        st.metric("Loaded from Cache", cached)
+    with col3:
+        st.metric("Newest Modelled Window", list(results)[-1])
+    st.caption("ℹ️ 'Loaded from Cache' reflects the first cohort run in this app session; later "
+               "runs reuse that result in memory until the data changes or the app restarts.")
+    if len(skipped):
+        listed = ", ".join(f"{window} ({count})" for window, count in skipped.items())
+        st.caption(f"⚠️ Skipped windows with fewer than {MIN_COHORT_SIZE} customers: {listed}")
+        if skipped.index[-1] > list(results)[-1]:
+            st.warning(f"The newest window, {skipped.index[-1]}, has too few customers to "
+                       f"model yet; the comparison ends at {list(results)[-1]}.")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        shares = comparison.pivot_table(index="Window", columns="Cluster",
+                                        values="Share", fill_value=0)
+        fig, ax = plt.subplots(figsize=(8, 5))
+        shares.plot(kind='bar', stacked=True, ax=ax, colormap='RdPu', edgecolor='white')
+        ax.set_xlabel("Acquisition Window")
+        ax.set_ylabel("Share of Customers")
+        ax.set_title("Cluster Mix per Window")
+        ax.legend(title="Cluster", bbox_to_anchor=(1.02, 1), loc='upper left')
+        plt.xticks(rotation=45)
+        st.pyplot(fig)
+        plt.close()
+    
+    with col2:
+        feature = st.selectbox("Feature", features, index=features.index("Total_Spending"))
+        trend = comparison.pivot_table(index="Window", columns="Cluster", values=feature)
+        fig, ax = plt.subplots(figsize=(8, 5))
+        trend.plot(ax=ax, marker='o')
+        ax.set_xlabel("Acquisition Window")
+        ax.set_ylabel(f"Mean {feature}")
+        ax.set_title(f"{feature} per Cluster over Time")
+        ax.legend(title="Cluster", bbox_to_anchor=(1.02, 1), loc='upper left')
+        ax.grid(True, alpha=0.3)
+        plt.xticks(rotation=45)
+        st.pyplot(fig)
+        plt.close()
+    
+    st.dataframe(
+        comparison.style.format({
+            "Income": "${:,.0f}",
+            "Total_Spending": "${:,.0f}",
+            "Age": "{:.1f}",
+            "NumWebPurchases": "{:.1f}",
+            "NumStorePurchases": "{:.1f}",
+            "NumWebVisitsMonth": "{:.1f}",
+            "Recency": "{:.1f}",
+            "Customer Count": "{:,.0f}",
+            "Share": "{:.1%}"
+        }),
+        use_container_width=True
+    )
+
+# =================================================
+# DRIFT MONITOR
+# =================================================
+def display_drift_monitor(drift_monitor):
+    """Show per-feature drift scores and cluster-mix shift for scored customers"""
+    st.markdown("Scored customers are summarized in constant-memory sketches and compared "
+                "with the training data. No scored rows are stored.")
+    
+    cluster_shares, cluster_psi = drift_monitor.cluster_shift()
+    # PSI on a handful of predictions is noise, so it is held back like the alerts
+    enough_scored = drift_monitor.scored >= MIN_SCORED
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric("Customers Scored", f"{drift_monitor.scored:,}")
+    with col2:
+        st.metric("Cluster Mix PSI", f"{cluster_psi:.3f}" if enough_scored else "n/a")
+    st.caption("ℹ️ The monitor is shared by every user of this deployment and starts over "
+               "when the model is retrained.")
+    
+    if drift_monitor.scored == 0:
+        st.info("💡 No customers scored yet. Predictions made below are tracked here.")
+        return
+    if not enough_scored:
+        st.info(f"💡 Cluster Mix PSI and alerts start after {MIN_SCORED} scored customers.")
+    
+    col1, col2 = st.columns([3, 2])
+    with col1:
+        st.dataframe(
+            drift_monitor.feature_drift().style.format({
+                "Reference Mean": "{:,.1f}",
+                "Scored Mean": "{:,.1f}",
+                "Mean Shift (σ)": "{:+.2f}",
+                "PSI": "{:.3f}",
+                "KS": "{:.3f}"
+            }),
+            use_container_width=True,
+            hide_index=True
+        )
+    
+    with col2:
+        fig, ax = plt.subplots(figsize=(8, 5))
+        cluster_shares.plot(kind='bar', ax=ax, color=['#cccccc', '#667eea'])
+        ax.set_xlabel("Cluster")
+        ax.set_ylabel("Share of Customers")
+        ax.set_title("Cluster Mix: Training vs Scored")
+        plt.xticks(rotation=0)
+        st.pyplot(fig)
+        plt.close()
+
+# =================================================
+# CLUSTER STABILITY
+# =================================================
+def display_cluster_stability(df, features, scaler, clusters, n_clusters, model_version, stability):
+    """Run or show the bootstrap stability analysis for the current model"""
+    st.markdown(f"Refits the model on {N_BOOTSTRAP} bootstrap resamples to check whether each "
+                "segment is real or an artefact of one random seed. Results are cached per model version.")
+    
+    if stability is None:
+        if st.button("🧪 Run Stability Analysis"):
+            with st.spinner(f"🔄 Refitting on {N_BOOTSTRAP} bootstrap samples..."):
+                X_scaled = scaler.transform(df[features])
+                _, error = get_stability(model_version, X_scaled, clusters, n_clusters,
+                                         engine=get_engine_name())
+            if error:
+                st.error(error)
+            else:
+                st.rerun()
+        return
+    
+    cluster_jaccard, confidence = stability
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        st.markdown("#### Per-Cluster Stability (Jaccard):")
+        for cluster_id, jaccard in enumerate(cluster_jaccard):
+            st.write(f"**Cluster {cluster_id}**: {jaccard:.2f} ({stability_label(jaccard)})")
+        st.metric("Low-Confidence Customers (< 80%)", f"{int((confidence < 0.8).sum()):,}")
+    
+    with col2:
+        fig, ax = plt.subplots(figsize=(8, 5))
+        ax.hist(confidence, bins=20, range=(0, 1), color='#667eea', alpha=0.8)
+        ax.set_xlabel("Assignment Confidence")
+        ax.set_ylabel("Number of Customers")
+        ax.set_title("Customer Assignment Confidence")
+        ax.grid(True, alpha=0.3)
+        st.pyplot(fig)
+        plt.close()
+
+# =================================================
+# PREDICTION AUDIT LOG
+# =================================================
+def display_audit_summary(audit_log, model_version):
+    """Show prediction volume per cluster and per user from the audit log"""
+    st.markdown(f"Every prediction is recorded with its inputs, cluster, user and model version "
+                f"(current model: `{model_version}`).")
+    
+    if not st.checkbox("Load audit summary"):
+        return
+    
+    try:
+        totals = aggregate_predictions(audit_log.log_dir)
+    except Exception as e:
+        st.error(f"❌ Error reading audit log: {e}")
+        return
+    
+    if totals.empty:
+        st.info("💡 No predictions recorded yet.")
+        return
+    
+    st.metric("Total Predictions", f"{int(totals['predictions'].sum()):,}")
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        fig, ax = plt.subplots(figsize=(8, 5))
+        predictions_per_cluster(totals).plot(kind='bar', ax=ax, color='#667eea')
+        ax.set_xlabel("Cluster")
+        ax.set_ylabel("Predictions")
+        ax.set_title("Predictions per Cluster")
+        plt.xticks(rotation=0)
+        st.pyplot(fig)
+        plt.close()
+    
+    with col2:
+        st.dataframe(predictions_per_user(totals).rename("Predictions").to_frame(),
+                     use_container_width=True)
+
 # =================================================
 # MAIN DASHBOARD
 # =================================================
@@ -327,7 +567,8 @@ def dashboard_page():
     
     # Train model
     with st.spinner("🤖 Training clustering model..."):
-        model, scaler, features, clusters, error = train_clustering_model(df)
+        model, scaler, features, clusters, projection, fit_report, error = \
+            train_clustering_model(df, get_engine_name())
     
     if error:
         st.error(error)
@@ -340,6 +581,23 @@ def dashboard_page():
     cluster_summary = df.groupby("Cluster")[features].mean().round(2)
     cluster_counts = df["Cluster"].value_counts().sort_index()
     
+    model_version = get_model_version(model, scaler)
+    audit_log = get_audit_log(tuple(features))
+    if audit_log.last_error:
+        st.error(f"❌ Prediction audit log: {audit_log.last_error}")
+    
+    # Bootstrap stability results, if this model version has been analysed
+    stability = load_stability(model_version)
+    if stability is not None:
+        cluster_jaccard, confidence = stability
+        # Kept out of df so cached functions keyed on the data never see it
+        assignment_confidence = pd.Series(confidence, index=df.index, name="Assignment Confidence")
+    
+    # Drift monitoring of everything scored against the training data
+    drift_monitor = init_drift_monitor(model_version, df[features], clusters, model.n_clusters)
+    for alert in drift_monitor.alerts():
+        st.warning(f"⚠️ Drift alert: {alert}")
+    
     # Display dataset overview
     with st.expander("📋 Dataset Overview", expanded=False):
         col1, col2, col3, col4 = st.columns(4)
@@ -352,8 +610,45 @@ def dashboard_page():
         with col4:
             st.metric("Avg. Spending", f"${df['Total_Spending'].mean():,.0f}")
         
+        iterations = fit_report["n_iter"] if fit_report["n_iter"] is not None else "n/a"
+        st.caption(f"🤖 Engine: **{fit_report['engine']}** · fit time {fit_report['fit_time']:.2f}s · "
+                   f"total iterations: {iterations} · inertia: {fit_report['inertia']:,.1f}")
+        
         st.dataframe(df.head(10), use_container_width=True)
     
+    # =================================================
+    # COHORT SEGMENTATION
+    # =================================================
+    with st.expander("📅 Cohort Segmentation", expanded=False):
+        st.markdown("Segment customers separately for each acquisition window (`Dt_Customer`) "
+                    "to track how segments shift over time. Cluster ids are aligned to the global model.")
+        col1, col2 = st.columns([1, 3])
+        with col1:
+            window_label = st.radio("Window", list(COHORT_FREQUENCIES), horizontal=True)
+            run_cohorts = st.checkbox("Run cohort segmentation")
+        
+        if run_cohorts:
+            display_cohort_comparison(df, features, model, scaler, COHORT_FREQUENCIES[window_label])
+    
+    # =================================================
+    # DRIFT MONITOR
+    # =================================================
+    with st.expander("🛰️ Drift Monitor", expanded=False):
+        display_drift_monitor(drift_monitor)
+    
+    # =================================================
+    # CLUSTER STABILITY
+    # =================================================
+    with st.expander("🧪 Cluster Stability", expanded=False):
+        display_cluster_stability(df, features, scaler, clusters, model.n_clusters,
+                                  model_version, stability)
+    
+    # =================================================
+    # PREDICTION AUDIT LOG
+    # =================================================
+    with st.expander("🧾 Prediction Audit Log", expanded=False):
+        display_audit_summary(audit_log, model_version)
+    
     # =================================================
     # CUSTOMER INPUT SECTION
     # =================================================
@@ -394,6 +689,9 @@ def dashboard_page():
             # Scale and predict
             input_scaled = scaler.transform(input_data)
             predicted_cluster = model.predict(input_scaled)[0]
+            drift_monitor.observe(input_data, [predicted_cluster])
+            audit_log.log_prediction(st.session_state.current_user, model_version,
+                                     input_data.iloc[0].to_dict(), predicted_cluster)
             
             # Display prediction
             st.markdown("---")
@@ -419,6 +717,9 @@ def dashboard_page():
                         st.write(f"**{feature}**: ${value:,.0f}")
                     else:
                         st.write(f"**{feature}**: {value:.1f}")
+                if stability is not None:
+                    jaccard = cluster_jaccard[predicted_cluster]
+                    st.write(f"**Stability**: {jaccard:.2f} ({stability_label(jaccard)})")
             
             with col2:
                 st.markdown("#### Customer Count per Cluster:")
@@ -433,6 +734,23 @@ def dashboard_page():
                 st.pyplot(fig)
                 plt.close()
             
+            # =================================================
+            # CLUSTER MAP
+            # =================================================
+            st.markdown("---")
+            st.markdown("## 🗺️ Cluster Map")
+            st.markdown("All customers projected onto the first two principal components. "
+                        "Colour shows the dominant cluster in each cell, opacity shows customer density.")
+            
+            input_coords = project(input_scaled, projection)[0]
+            fig = plot_projection(projection, highlight=input_coords,
+                                  highlight_cluster=predicted_cluster)
+            st.pyplot(fig)
+            plt.close()
+            if projection["outside"]:
+                st.caption(f"ℹ️ {projection['outside']:,} outlying customers fall outside the map "
+                           "extent and are not drawn.")
+            
             # =================================================
             # COMPARISON VISUALIZATIONS
             # =================================================
@@ -486,20 +804,25 @@ def dashboard_page():
             
             summary_display = cluster_summary.copy()
             summary_display["Customer Count"] = cluster_counts.values
+            summary_format = {
+                "Income": "${:,.0f}",
+                "Total_Spending": "${:,.0f}",
+                "Age": "{:.1f}",
+                "NumWebPurchases": "{:.1f}",
+                "NumStorePurchases": "{:.1f}",
+                "NumWebVisitsMonth": "{:.1f}",
+                "Recency": "{:.1f}",
+                "Customer Count": "{:,.0f}"
+            }
+            if stability is not None:
+                summary_display["Stability (Jaccard)"] = cluster_jaccard
+                summary_display["Avg. Confidence"] = assignment_confidence.groupby(df["Cluster"]).mean()
+                summary_format.update({"Stability (Jaccard)": "{:.2f}", "Avg. Confidence": "{:.0%}"})
             
             # Format the dataframe
             st.dataframe(
                 summary_display.style
-                .format({
-                    "Income": "${:,.0f}",
-                    "Total_Spending": "${:,.0f}",
-                    "Age": "{:.1f}",
-                    "NumWebPurchases": "{:.1f}",
-                    "NumStorePurchases": "{:.1f}",
-                    "NumWebVisitsMonth": "{:.1f}",
-                    "Recency": "{:.1f}",
-                    "Customer Count": "{:,.0f}"
-                })
+                .format(summary_format)
                 .background_gradient(cmap="RdPu", subset=["Income", "Total_Spending"])
                 .highlight_max(axis=0, color='lightgreen')
                 .highlight_min(axis=0, color='lightcoral'),
@@ -0,0 +1,213 @@
+"""
+Prediction Audit Log
+Records every segment prediction (inputs, cluster, model version, user,
+timestamp). The dashboard only enqueues records; a background thread
+batches them into size-rotated CSV files and flushes on shutdown.
+"""
+
+import os
+import csv
+import sys
+import glob
+import queue
+import time
+import atexit
+import tempfile
+import threading
+from datetime import datetime, timezone
+
+import pandas as pd
+
+AUDIT_LOG_DIR = "audit_logs"
+AUDIT_LOG_PREFIX = "predictions"
+MAX_LOG_BYTES = 10 * 1024 * 1024
+SHUTDOWN_RETRIES = 3
+_STOP = object()
+
+# =================================================
+# WRITER
+# =================================================
+class AuditLog:
+    """Queue-backed prediction log with a single background writer thread"""
+
+    def __init__(self, features, log_dir=AUDIT_LOG_DIR, max_bytes=MAX_LOG_BYTES,
+                 batch_size=500, flush_interval=1.0, max_queue=10000,
+                 enqueue_timeout=5.0, retry_delay=0.5, max_retry_delay=30.0):
+        self.features = list(features)
+        self.columns = ["timestamp", "user", "model_version", "cluster"] + self.features
+        self.log_dir = log_dir
+        self.max_bytes = max_bytes
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.last_error = None
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._closed = False
+        # Makes the closed check and the enqueue one step, so nothing lands after _STOP
+        self._lock = threading.Lock()
+        os.makedirs(log_dir, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="audit-log-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    @property
+    def path(self):
+        return os.path.join(self.log_dir, f"{AUDIT_LOG_PREFIX}.csv")
+
+    def log_prediction(self, user, model_version, inputs, cluster):
+        """Enqueue one prediction; never touches the disk on the caller's thread"""
+        record = [datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+                  user, model_version, int(cluster)]
+        record += [inputs[feature] for feature in self.features]
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Audit log is closed")
+            # Block rather than drop when the writer falls behind: every prediction must be
+            # kept. If the writer stays stuck (e.g. disk failure), fail the caller instead.
+            try:
+                self._queue.put(record, timeout=self.enqueue_timeout)
+            except queue.Full:
+                raise RuntimeError(f"Audit log is not accepting records: "
+                                   f"{self.last_error or 'write queue is full'}")
+
+    def flush(self, timeout=None):
+        """Wait until everything enqueued so far has been written; False on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def close(self):
+        """Write any queued records and stop the writer thread"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_STOP)
+        self._thread.join()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = self._next_batch()
+            stopping = batch[-1] is _STOP
+            records = [record for record in batch if record is not _STOP]
+            if records:
+                self._write_with_retry(records)
+            # Only acknowledged once the records are on disk, so flush() can't lie
+            for _ in batch:
+                self._queue.task_done()
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size and batch[-1] is not _STOP:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write_with_retry(self, records):
+        """Retry with backoff until written; on shutdown, fall back to a separate file
+
+        No new records are dequeued while a batch is failing, so memory stays
+        bounded and the full queue pushes the failure back to log_prediction.
+        """
+        delay = self.retry_delay
+        attempt = 0
+        while True:
+            try:
+                self._write(records)
+                self.last_error = None
+                return
+            except Exception as e:
+                self.last_error = f"Error writing audit log: {str(e)}"
+            attempt += 1
+            if self._closed and attempt >= SHUTDOWN_RETRIES:
+                self._write_fallback(records)
+                return
+            # Don't let a long backoff hold up shutdown
+            time.sleep(self.retry_delay if self._closed else delay)
+            delay = min(delay * 2, self.max_retry_delay)
+
+    def _write_fallback(self, records):
+        """Last resort on shutdown: a separate file in the log dir, temp dir, or stderr"""
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+        name = f"{AUDIT_LOG_PREFIX}-unwritten-{stamp}.csv"
+        for directory in (self.log_dir, tempfile.gettempdir()):
+            path = os.path.join(directory, name)
+            try:
+                with open(path, "w", newline="") as f:
+                    writer = csv.writer(f)
+                    writer.writerow(self.columns)
+                    writer.writerows(records)
+                self.last_error = f"{self.last_error}; {len(records)} records saved to {path}"
+                return
+            except Exception:
+                continue
+        writer = csv.writer(sys.stderr)
+        writer.writerow(self.columns)
+        writer.writerows(records)
+
+    def _write(self, records):
+        self._rotate_if_needed()
+        new_file = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        with open(self.path, "a", newline="") as f:
+            writer = csv.writer(f)
+            if new_file:
+                writer.writerow(self.columns)
+            writer.writerows(records)
+
+    def _rotate_if_needed(self):
+        if os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+            stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+            os.replace(self.path, os.path.join(self.log_dir, f"{AUDIT_LOG_PREFIX}-{stamp}.csv"))
+
+# =================================================
+# READER
+# =================================================
+def log_files(log_dir=AUDIT_LOG_DIR):
+    """All audit log files, rotated ones first (oldest to newest), live file last"""
+    rotated = sorted(glob.glob(os.path.join(log_dir, f"{AUDIT_LOG_PREFIX}-*.csv")))
+    live = os.path.join(log_dir, f"{AUDIT_LOG_PREFIX}.csv")
+    return rotated + ([live] if os.path.exists(live) else [])
+
+def aggregate_predictions(log_dir=AUDIT_LOG_DIR, chunksize=1_000_000):
+    """Prediction counts per (user, cluster) across all log files
+
+    Only the two needed columns are parsed, in fixed-size chunks, so memory
+    stays flat no matter how long the history is.
+    """
+    partials = []
+    for path in log_files(log_dir):
+        # No NA parsing: usernames like "null", "None" or "N/A" are real users
+        reader = pd.read_csv(path, usecols=["user", "cluster"],
+                             dtype={"user": "category", "cluster": "int16"},
+                             keep_default_na=False, na_filter=False,
+                             chunksize=chunksize)
+        for chunk in reader:
+            counts = chunk.groupby(["user", "cluster"], observed=True).size()
+            counts = counts.rename("predictions").reset_index()
+            counts["user"] = counts["user"].astype(str)
+            partials.append(counts)
+
+    if not partials:
+        return pd.DataFrame(columns=["user", "cluster", "predictions"])
+    return (pd.concat(partials, ignore_index=True)
+            .groupby(["user", "cluster"], as_index=False)["predictions"].sum())
+
+def predictions_per_cluster(totals):
+    return totals.groupby("cluster")["predictions"].sum().sort_index()
+
+def predictions_per_user(totals):
+    return totals.groupby("user")["predictions"].sum().sort_values(ascending=False)
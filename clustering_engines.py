@@ -0,0 +1,247 @@
+"""
+Clustering Engines
+Interchangeable backends for fitting the segmentation model. The engine is
+chosen per deployment with the CLUSTERING_ENGINE environment variable and
+every fit reports its time, total iteration count (summed over all
+restarts or bisections) and inertia so engines can be compared on real data:
+
+    python clustering_engines.py
+"""
+
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.cluster import KMeans, BisectingKMeans, kmeans_plusplus
+from sklearn.utils import check_random_state
+
+DEFAULT_ENGINE = "kmeans"
+N_RESTARTS = 10
+SEEDING_SAMPLE_SIZE = 20000
+
+# =================================================
+# SEEDING
+# =================================================
+def squared_distances_to_nearest(X, centers, chunk_size=65536):
+    """Squared distance from every row to its nearest center, plus that center's index"""
+    center_norms = (centers ** 2).sum(axis=1)
+    d2 = np.empty(len(X))
+    nearest = np.empty(len(X), dtype=np.int64)
+    for start in range(0, len(X), chunk_size):
+        block = X[start:start + chunk_size]
+        dist = (block ** 2).sum(axis=1)[:, None] - 2 * block @ centers.T + center_norms[None, :]
+        nearest[start:start + chunk_size] = dist.argmin(axis=1)
+        d2[start:start + chunk_size] = np.maximum(dist.min(axis=1), 0)
+    return d2, nearest
+
+def sampled_kmeans_plusplus(X, n_clusters, random_state, sample_size=SEEDING_SAMPLE_SIZE):
+    """k-means++ seeding on a uniform sample instead of the full matrix"""
+    rng = np.random.default_rng(random_state)
+    if len(X) > sample_size:
+        X = X[rng.choice(len(X), sample_size, replace=False)]
+    centers, _ = kmeans_plusplus(X, n_clusters, random_state=random_state)
+    return centers
+
+def kmeans_parallel(X, n_clusters, random_state, rounds=5, oversampling=None):
+    """k-means|| seeding (Bahmani et al.): a few oversampling passes, then weighted k-means++"""
+    rng = np.random.default_rng(random_state)
+    oversampling = oversampling or 2 * n_clusters
+
+    candidates = X[rng.integers(len(X))][None, :]
+    d2, _ = squared_distances_to_nearest(X, candidates)
+    for _ in range(rounds):
+        cost = d2.sum()
+        if cost == 0:
+            break
+        chosen = X[rng.random(len(X)) < np.minimum(1.0, oversampling * d2 / cost)]
+        if len(chosen) == 0:
+            continue
+        candidates = np.vstack([candidates, chosen])
+        d2 = np.minimum(d2, squared_distances_to_nearest(X, chosen)[0])
+
+    if len(candidates) < n_clusters:
+        extra = X[rng.choice(len(X), n_clusters - len(candidates), replace=False)]
+        candidates = np.vstack([candidates, extra])
+
+    # Weight each candidate by how many rows it is closest to, then reduce to k
+    _, nearest = squared_distances_to_nearest(X, candidates)
+    weights = np.bincount(nearest, minlength=len(candidates)).astype(X.dtype)
+    centers, _ = kmeans_plusplus(candidates, n_clusters, sample_weight=weights + 1e-12,
+                                 random_state=random_state)
+    return centers
+
+# =================================================
+# MODELS
+# =================================================
+class Float32Model:
+    """Model fitted on float32: keeps float32 centers and casts every input to match
+
+    sklearn's KMeans.predict() rejects input whose dtype differs from the
+    centers', so float64 (dashboard) and float32 rows are both cast here.
+    """
+
+    def __init__(self, model):
+        self.model = model
+
+    def predict(self, X):
+        return self.model.predict(np.asarray(X, dtype=self.model.cluster_centers_.dtype))
+
+    def __getattr__(self, name):
+        # Guard so unpickling (before self.model exists) doesn't recurse
+        if name == "model":
+            raise AttributeError(name)
+        return getattr(self.model, name)
+
+
+class CountingBisectingKMeans(BisectingKMeans):
+    """BisectingKMeans that reports n_iter_: the Lloyd/Elkan iterations of all its bisections
+
+    BisectingKMeans picks its inner single-run k-means function in fit() and
+    stores it as _kmeans_single; routing that through a property lets every
+    inner run's iteration count be summed without copying sklearn's algorithm.
+    That attribute is private, so if a sklearn release stops using it n_iter_
+    stays 0 and fit_bisecting reports None (test_clustering_engines catches it).
+    """
+
+    @property
+    def _kmeans_single(self):
+        return self._counted_kmeans_single
+
+    @_kmeans_single.setter
+    def _kmeans_single(self, func):
+        self.__dict__["_kmeans_single_impl"] = func
+
+    def _counted_kmeans_single(self, *args, **kwargs):
+        labels, inertia, centers, n_iter = self._kmeans_single_impl(*args, **kwargs)
+        self.n_iter_ += n_iter
+        return labels, inertia, centers, n_iter
+
+    def fit(self, X, y=None, sample_weight=None):
+        self.n_iter_ = 0
+        return super().fit(X, y, sample_weight)
+
+def fit_with_restarts(X, n_clusters, random_state, n_init=N_RESTARTS, algorithm="lloyd"):
+    """KMeans(n_init=n_init) with the restarts run here, so every restart's iterations count
+
+    Seeds are drawn from one RandomState in sequence and the first lowest-inertia
+    run is kept, as KMeans does internally, so the fitted model is unchanged.
+    """
+    rng = check_random_state(random_state)
+    best, total_iter = None, 0
+    for _ in range(n_init):
+        init, _ = kmeans_plusplus(X, n_clusters, random_state=rng)
+        model = KMeans(n_clusters=n_clusters, init=init, n_init=1, algorithm=algorithm,
+                       random_state=random_state).fit(X)
+        total_iter += model.n_iter_
+        if best is None or model.inertia_ < best.inertia_:
+            best = model
+    return best, total_iter
+
+# =================================================
+# ENGINES
+# =================================================
+# Each engine returns (model, total iterations across all restarts/bisections, or None)
+def fit_kmeans(X, n_clusters, random_state):
+    """Original model: Lloyd K-Means on float64, 10 k-means++ restarts"""
+    return fit_with_restarts(X, n_clusters, random_state)
+
+def fit_elkan_float32(X, n_clusters, random_state):
+    """Elkan K-Means (triangle-inequality pruning) on float32, 10 k-means++ restarts"""
+    model, n_iter = fit_with_restarts(X.astype(np.float32), n_clusters, random_state,
+                                      algorithm="elkan")
+    return Float32Model(model), n_iter
+
+def fit_bisecting(X, n_clusters, random_state):
+    """Bisecting K-Means: repeatedly splits the largest-inertia cluster"""
+    model = CountingBisectingKMeans(n_clusters=n_clusters, random_state=random_state,
+                                    bisecting_strategy="largest_cluster").fit(X)
+    return model, model.n_iter_ or None
+
+def fit_sampled_plusplus(X, n_clusters, random_state):
+    """Single Lloyd run on float32, seeded by k-means++ on a sample"""
+    X = X.astype(np.float32)
+    init = sampled_kmeans_plusplus(X, n_clusters, random_state)
+    model = KMeans(n_clusters=n_clusters, init=init, n_init=1, random_state=random_state)
+    model.fit(X)
+    return Float32Model(model), model.n_iter_
+
+def fit_kmeans_parallel(X, n_clusters, random_state):
+    """Single Lloyd run on float32, seeded by k-means||"""
+    X = X.astype(np.float32)
+    init = kmeans_parallel(X, n_clusters, random_state)
+    model = KMeans(n_clusters=n_clusters, init=init, n_init=1, random_state=random_state)
+    model.fit(X)
+    return Float32Model(model), model.n_iter_
+
+CLUSTERING_ENGINES = {
+    "kmeans": fit_kmeans,
+    "elkan_float32": fit_elkan_float32,
+    "bisecting": fit_bisecting,
+    "sampled_kmeans++": fit_sampled_plusplus,
+    "kmeans||": fit_kmeans_parallel,
+}
+
+def get_engine_name():
+    """Engine configured for this deployment (CLUSTERING_ENGINE env var)"""
+    return os.environ.get("CLUSTERING_ENGINE", DEFAULT_ENGINE)
+
+def fit_engine(engine, X, n_clusters=6, random_state=42):
+    """Fit one engine and report labels, fit time, total iterations and inertia"""
+    if engine not in CLUSTERING_ENGINES:
+        raise ValueError(f"Unknown clustering engine '{engine}'. "
+                         f"Available: {', '.join(CLUSTERING_ENGINES)}")
+
+    X = np.asarray(X, dtype=np.float64)
+    start = time.perf_counter()
+    model, n_iter = CLUSTERING_ENGINES[engine](X, n_clusters, random_state)
+    fit_time = time.perf_counter() - start
+
+    labels = model.predict(X)
+
+    # Inertia recomputed in float64 so every engine is measured the same way
+    centers = np.asarray(model.cluster_centers_, dtype=np.float64)
+    inertia = float(((X - centers[labels]) ** 2).sum())
+    return {
+        "engine": engine,
+        "model": model,
+        "labels": labels,
+        "fit_time": fit_time,
+        "n_iter": n_iter,
+        "inertia": inertia,
+    }
+
+# =================================================
+# BENCHMARK
+# =================================================
+def benchmark_engines(X, engines=None, n_clusters=6, random_state=42):
+    """Fit every engine on the same data and compare speed and quality"""
+    rows = []
+    for engine in engines or CLUSTERING_ENGINES:
+        result = fit_engine(engine, X, n_clusters, random_state)
+        rows.append({
+            "Engine": engine,
+            "Fit Time (s)": result["fit_time"],
+            "Total Iterations": result["n_iter"],
+            "Inertia": result["inertia"],
+        })
+    report = pd.DataFrame(rows)
+    report["Inertia vs Best"] = report["Inertia"] / report["Inertia"].min() - 1
+    return report.sort_values("Fit Time (s)", ignore_index=True)
+
+if __name__ == "__main__":
+    from sklearn.preprocessing import StandardScaler
+
+    df = pd.read_csv("customer_segmentation.csv")
+    df.dropna(inplace=True)
+    df["Age"] = 2026 - df["Year_Birth"]
+    df["Total_Spending"] = df[["MntWines", "MntFruits", "MntMeatProducts",
+                               "MntFishProducts", "MntSweetProducts",
+                               "MntGoldProds"]].sum(axis=1)
+    features = ["Age", "Income", "Total_Spending",
+                "NumWebPurchases", "NumStorePurchases",
+                "NumWebVisitsMonth", "Recency"]
+
+    X_scaled = StandardScaler().fit_transform(df[features])
+    print(f"Benchmarking {len(CLUSTERING_ENGINES)} engines on {len(X_scaled):,} customers\n")
+    print(benchmark_engines(X_scaled).to_string(index=False))
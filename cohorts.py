@@ -0,0 +1,167 @@
+"""
+Cohort Segmentation by Acquisition Window
+Partitions customers by Dt_Customer (quarter or year), trains one K-Means
+model per window in parallel and caches each window's model on disk, so
+only windows whose data changed (normally just the newest) are retrained
+"""
+
+import os
+import pickle
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import linear_sum_assignment
+from sklearn.preprocessing import StandardScaler
+from threadpoolctl import threadpool_limits
+
+from clustering_engines import DEFAULT_ENGINE, fit_engine
+
+COHORT_CACHE_DIR = "cohort_models"
+COHORT_FREQUENCIES = {"Quarter": "Q", "Year": "Y"}
+MIN_COHORT_SIZE = 30
+
+# =================================================
+# PARTITIONING
+# =================================================
+def assign_cohorts(df, freq="Q"):
+    """Label each customer with the acquisition window of its Dt_Customer date"""
+    dates = pd.to_datetime(df["Dt_Customer"], format="%d-%m-%Y", errors="coerce")
+    return dates.dt.to_period(freq).astype(str).where(dates.notna())
+
+def window_fingerprint(window_df, features):
+    """Cheap content hash of a window's feature rows, used as its cache key"""
+    row_hashes = pd.util.hash_pandas_object(window_df[features], index=False).values
+    return hashlib.sha1(row_hashes.tobytes()).hexdigest()
+
+def small_windows(df, freq="Q"):
+    """Customer counts of the windows too small to model (skipped by train_cohort_models)"""
+    sizes = assign_cohorts(df, freq).value_counts().sort_index()
+    return sizes[sizes < MIN_COHORT_SIZE]
+
+# =================================================
+# TRAINING
+# =================================================
+def train_window_model(X, n_clusters=6, engine=DEFAULT_ENGINE):
+    """Fit scaler and K-Means for a single window (runs in a worker process)"""
+    # One BLAS/OpenMP thread per worker: the pool already uses every core
+    with threadpool_limits(limits=1):
+        scaler = StandardScaler()
+        X_scaled = scaler.fit_transform(X)
+        result = fit_engine(engine, X_scaled, n_clusters=min(n_clusters, len(X)),
+                            random_state=42)
+    return result["model"], scaler, result["labels"]
+
+def cache_path(freq, window, engine=DEFAULT_ENGINE, n_clusters=6, cache_dir=COHORT_CACHE_DIR):
+    """File that holds the cached model for one window"""
+    return os.path.join(cache_dir, f"{engine}_k{n_clusters}_{freq}_{window}.pkl")
+
+def load_cached_window(freq, window, fingerprint, engine=DEFAULT_ENGINE, n_clusters=6,
+                       cache_dir=COHORT_CACHE_DIR):
+    """Return the cached entry for a window if its data hasn't changed"""
+    path = cache_path(freq, window, engine, n_clusters, cache_dir)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as f:
+            entry = pickle.load(f)
+        if entry.get("fingerprint") != fingerprint or entry.get("n_clusters") != n_clusters:
+            return None
+        return entry
+    except Exception:
+        return None
+
+def save_cached_window(freq, window, entry, engine=DEFAULT_ENGINE, n_clusters=6,
+                       cache_dir=COHORT_CACHE_DIR):
+    """Persist one window's entry to the cache directory"""
+    os.makedirs(cache_dir, exist_ok=True)
+    path = cache_path(freq, window, engine, n_clusters, cache_dir)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(entry, f)
+    os.replace(tmp_path, path)
+
+def train_cohort_models(df, features, freq="Q", n_clusters=6, engine=DEFAULT_ENGINE,
+                        cache_dir=COHORT_CACHE_DIR, max_workers=None):
+    """Train (or load from cache) one model per acquisition window"""
+    try:
+        if "Dt_Customer" not in df.columns:
+            return None, "Missing column in dataset: Dt_Customer"
+
+        cohorts = assign_cohorts(df, freq)
+        results, jobs = {}, {}
+        for window, window_df in df.groupby(cohorts, sort=True):
+            if len(window_df) < MIN_COHORT_SIZE:
+                continue
+            fingerprint = window_fingerprint(window_df, features)
+            entry = load_cached_window(freq, window, fingerprint, engine, n_clusters, cache_dir)
+            if entry is not None:
+                entry["from_cache"] = True
+                results[window] = entry
+            else:
+                jobs[window] = (window_df, fingerprint)
+
+        if jobs:
+            workers = min(len(jobs), max_workers or os.cpu_count() or 1)
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = {
+                    window: executor.submit(train_window_model,
+                                            window_df[features].to_numpy(), n_clusters, engine)
+                    for window, (window_df, _) in jobs.items()
+                }
+                for window, future in futures.items():
+                    window_df, fingerprint = jobs[window]
+                    model, scaler, clusters = future.result()
+                    entry = {
+                        "fingerprint": fingerprint,
+                        "n_clusters": n_clusters,
+                        "model": model,
+                        "scaler": scaler,
+                        "summary": summarize_window(window_df, features, clusters),
+                    }
+                    save_cached_window(freq, window, entry, engine, n_clusters, cache_dir)
+                    entry["from_cache"] = False
+                    results[window] = entry
+
+        if not results:
+            return None, f"No acquisition window has at least {MIN_COHORT_SIZE} customers"
+
+        return dict(sorted(results.items())), None
+    except Exception as e:
+        return None, f"Error training cohort models: {str(e)}"
+
+# =================================================
+# COMPARISON
+# =================================================
+def summarize_window(window_df, features, clusters):
+    """Per-cluster feature means and customer counts for one window"""
+    summary = window_df[features].groupby(np.asarray(clusters)).mean()
+    summary["Customer Count"] = np.bincount(clusters, minlength=len(summary))[summary.index]
+    summary.index.name = "Cluster"
+    return summary
+
+def align_to_reference(entry, features, reference_model, reference_scaler):
+    """Map a window's cluster ids onto the closest global clusters (Hungarian matching)"""
+    centers = entry["scaler"].inverse_transform(entry["model"].cluster_centers_)
+    centers = reference_scaler.transform(pd.DataFrame(centers, columns=features))
+    cost = ((centers[:, None, :] - reference_model.cluster_centers_[None, :, :]) ** 2).sum(axis=2)
+    rows, cols = linear_sum_assignment(cost)
+    return dict(zip(rows, cols))
+
+def compare_cohorts(results, features, reference_model=None, reference_scaler=None):
+    """Stack every window's summary into one table, keyed by window and cluster"""
+    frames = []
+    for window, entry in results.items():
+        summary = entry["summary"].copy()
+        if reference_model is not None:
+            mapping = align_to_reference(entry, features, reference_model, reference_scaler)
+            summary.index = [mapping.get(c, c) for c in summary.index]
+            summary = summary.sort_index()
+        summary.index.name = "Cluster"
+        summary.insert(0, "Window", window)
+        frames.append(summary.reset_index())
+    comparison = pd.concat(frames, ignore_index=True)
+    counts = comparison.groupby("Window")["Customer Count"].transform("sum")
+    comparison["Share"] = comparison["Customer Count"] / counts
+    return comparison
@@ -0,0 +1,269 @@
+"""
+Streaming Drift Monitor
+Keeps constant-memory sketches (running moments + KLL-style quantile
+sketches) of the model features for the training set and for everything
+scored since, and compares them to flag feature and cluster-mix drift.
+Scored rows are folded into the sketches and never stored.
+"""
+
+import threading
+
+import numpy as np
+import pandas as pd
+
+PSI_WARNING = 0.1
+PSI_ALERT = 0.2
+MIN_SCORED = 200
+EPSILON = 1e-4
+
+# =================================================
+# SKETCHES
+# =================================================
+class RunningMoments:
+    """Count, mean, variance, min and max, updated batch by batch (Chan/Welford)"""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        if len(values) == 0:
+            return
+        n_b = len(values)
+        mean_b = values.mean()
+        m2_b = ((values - mean_b) ** 2).sum()
+        self._combine(n_b, mean_b, m2_b, values.min(), values.max())
+
+    def merge(self, other):
+        if other.count:
+            self._combine(other.count, other.mean, other.m2, other.min, other.max)
+
+    def _combine(self, n_b, mean_b, m2_b, min_b, max_b):
+        n = self.count + n_b
+        delta = mean_b - self.mean
+        self.mean += delta * n_b / n
+        self.m2 += m2_b + delta ** 2 * self.count * n_b / n
+        self.count = n
+        self.min = min(self.min, min_b)
+        self.max = max(self.max, max_b)
+
+    @property
+    def std(self):
+        return np.sqrt(self.m2 / self.count) if self.count else 0.0
+
+
+class QuantileSketch:
+    """Mergeable KLL-style quantile sketch: level h holds items of weight 2**h"""
+
+    def __init__(self, k=400, seed=42):
+        self.k = k
+        self.count = 0
+        self.levels = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        depth = len(self.levels) - level - 1
+        return max(8, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float).ravel()
+        values = values[~np.isnan(values)]
+        self.count += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+
+    def merge(self, other):
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for h, items in enumerate(other.levels):
+            self.levels[h] = np.concatenate([self.levels[h], items])
+        self.count += other.count
+        self._compress()
+
+    def _compress(self):
+        h = 0
+        while h < len(self.levels):
+            items = self.levels[h]
+            if len(items) >= self._capacity(h):
+                if h + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(items)
+                # An odd item out stays behind so total weight is preserved exactly
+                leftover = items[-1:] if len(items) % 2 else items[:0]
+                paired = items[:len(items) - len(leftover)]
+                promoted = paired[self._rng.integers(2)::2]
+                self.levels[h] = leftover
+                self.levels[h + 1] = np.concatenate([self.levels[h + 1], promoted])
+            h += 1
+
+    @property
+    def size(self):
+        """Number of retained items (the sketch's memory footprint)"""
+        return sum(len(items) for items in self.levels)
+
+    def _weighted_items(self):
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(lvl), 2.0 ** h) for h, lvl in enumerate(self.levels)])
+        order = np.argsort(items, kind="stable")
+        return items[order], weights[order]
+
+    def cdf(self, x):
+        """Estimated fraction of values <= x"""
+        items, weights = self._weighted_items()
+        if len(items) == 0:
+            return np.zeros(np.shape(x))
+        cumulative = np.cumsum(weights) / weights.sum()
+        idx = np.searchsorted(items, x, side="right")
+        return np.where(idx > 0, cumulative[np.maximum(idx - 1, 0)], 0.0)
+
+    def quantile(self, q):
+        """Estimated value at quantile(s) q"""
+        items, weights = self._weighted_items()
+        cumulative = np.cumsum(weights) / weights.sum()
+        idx = np.searchsorted(cumulative, q, side="left")
+        return items[np.minimum(idx, len(items) - 1)]
+
+    def retained(self):
+        return np.unique(np.concatenate(self.levels))
+
+
+class FeatureSketch:
+    """Moments and quantile sketch for a single feature"""
+
+    def __init__(self, k=400):
+        self.moments = RunningMoments()
+        self.quantiles = QuantileSketch(k=k)
+
+    def update(self, values):
+        self.moments.update(values)
+        self.quantiles.update(values)
+
+# =================================================
+# DRIFT SCORES
+# =================================================
+def population_stability_index(expected, actual):
+    """PSI between two proportion vectors over the same bins"""
+    expected = np.clip(np.asarray(expected, dtype=float), EPSILON, None)
+    actual = np.clip(np.asarray(actual, dtype=float), EPSILON, None)
+    return float(((actual - expected) * np.log(actual / expected)).sum())
+
+def binned_proportions(sketch, edges):
+    """Proportion of a sketch's mass in each bin delimited by interior edges"""
+    cdf = np.concatenate([[0.0], sketch.cdf(edges), [1.0]])
+    return np.diff(cdf)
+
+def feature_drift_score(reference, current, n_bins=10):
+    """PSI over reference deciles, KS distance and standardized mean shift"""
+    edges = np.unique(reference.quantiles.quantile(np.linspace(0, 1, n_bins + 1)[1:-1]))
+    psi = population_stability_index(binned_proportions(reference.quantiles, edges),
+                                      binned_proportions(current.quantiles, edges))
+
+    points = np.union1d(reference.quantiles.retained(), current.quantiles.retained())
+    ks = float(np.abs(reference.quantiles.cdf(points) - current.quantiles.cdf(points)).max())
+
+    scale = reference.moments.std or 1.0
+    mean_shift = (current.moments.mean - reference.moments.mean) / scale
+    return psi, ks, mean_shift
+
+def drift_status(psi):
+    if psi >= PSI_ALERT:
+        return "🔴 Drift"
+    if psi >= PSI_WARNING:
+        return "🟡 Watch"
+    return "🟢 Stable"
+
+# =================================================
+# MONITOR
+# =================================================
+class DriftMonitor:
+    """Reference sketches from training vs running sketches of scored customers"""
+
+    def __init__(self, features, n_clusters, k=400):
+        self.features = list(features)
+        self.n_clusters = n_clusters
+        self.k = k
+        self.reference = {f: FeatureSketch(k) for f in self.features}
+        self.current = {f: FeatureSketch(k) for f in self.features}
+        self.reference_clusters = np.zeros(n_clusters, dtype=np.int64)
+        self.current_clusters = np.zeros(n_clusters, dtype=np.int64)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_training(cls, X, clusters, features, n_clusters, k=400):
+        """Build a monitor whose reference sketches summarize the training set"""
+        monitor = cls(features, n_clusters, k=k)
+        X = pd.DataFrame(X, columns=features)
+        for feature in features:
+            monitor.reference[feature].update(X[feature].to_numpy())
+        monitor.reference_clusters += np.bincount(clusters, minlength=n_clusters)
+        return monitor
+
+    @property
+    def scored(self):
+        return int(self.current_clusters.sum())
+
+    def observe(self, X, clusters):
+        """Fold a scored batch (or a single prediction) into the running sketches"""
+        X = pd.DataFrame(X, columns=self.features)
+        counts = np.bincount(np.asarray(clusters, dtype=np.int64).ravel(),
+                             minlength=self.n_clusters)
+        with self._lock:
+            for feature in self.features:
+                self.current[feature].update(X[feature].to_numpy())
+            self.current_clusters += counts
+
+    def reset(self):
+        """Start a fresh monitoring window, keeping the training reference"""
+        with self._lock:
+            self.current = {f: FeatureSketch(self.k) for f in self.features}
+            self.current_clusters = np.zeros(self.n_clusters, dtype=np.int64)
+
+    def feature_drift(self):
+        """Per-feature drift table (empty until something has been scored)"""
+        rows = []
+        with self._lock:
+            if self.scored == 0:
+                return pd.DataFrame(columns=["Feature", "Reference Mean", "Scored Mean",
+                                             "Mean Shift (σ)", "PSI", "KS", "Status"])
+            for feature in self.features:
+                reference, current = self.reference[feature], self.current[feature]
+                psi, ks, mean_shift = feature_drift_score(reference, current)
+                rows.append({
+                    "Feature": feature,
+                    "Reference Mean": reference.moments.mean,
+                    "Scored Mean": current.moments.mean,
+                    "Mean Shift (σ)": mean_shift,
+                    "PSI": psi,
+                    "KS": ks,
+                    "Status": drift_status(psi),
+                })
+        return pd.DataFrame(rows)
+
+    def cluster_shift(self):
+        """Reference vs scored cluster-assignment shares and the PSI between them"""
+        with self._lock:
+            reference = self.reference_clusters / max(self.reference_clusters.sum(), 1)
+            current = self.current_clusters / max(self.current_clusters.sum(), 1)
+        table = pd.DataFrame({"Reference Share": reference, "Scored Share": current})
+        table.index.name = "Cluster"
+        psi = population_stability_index(reference, current) if self.scored else 0.0
+        return table, psi
+
+    def alerts(self, min_scored=MIN_SCORED):
+        """Human-readable alerts, suppressed until enough customers have been scored"""
+        if self.scored < min_scored:
+            return []
+        messages = []
+        for row in self.feature_drift().to_dict("records"):
+            if row["PSI"] >= PSI_ALERT:
+                messages.append(f"**{row['Feature']}** has drifted (PSI {row['PSI']:.2f}, "
+                                f"mean shift {row['Mean Shift (σ)']:+.2f}σ)")
+        _, psi = self.cluster_shift()
+        if psi >= PSI_ALERT:
+            messages.append(f"**Cluster mix** has shifted (PSI {psi:.2f})")
+        return messages
@@ -0,0 +1,106 @@
+"""
+2-D Projection of Customer Clusters
+PCA projection fitted once per model and binned on the server, so the
+cluster map costs the same to draw for 2 thousand or 2 million customers
+"""
+
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.colors import to_rgb
+from matplotlib.patches import Patch
+from sklearn.decomposition import PCA
+
+CLUSTER_COLORS = ['#667eea', '#ff1493', '#2ca02c', '#ff7f0e', '#17becf',
+                  '#8c564b', '#bcbd22', '#7f7f7f', '#9467bd', '#d62728']
+
+# =================================================
+# FITTING
+# =================================================
+def fit_projection(X_scaled, clusters, n_clusters, gridsize=None):
+    """Fit a 2-component PCA and bin every customer into a cluster-count grid"""
+    if gridsize is None:
+        # Finer cells as data grows, capped so the image stays small
+        gridsize = int(np.clip(np.sqrt(len(X_scaled)), 40, 200))
+
+    pca = PCA(n_components=2, random_state=42)
+    coords = pca.fit_transform(X_scaled)
+
+    # Clip the extent to the central 99.8% so a few outliers don't squash the map
+    low = np.percentile(coords, 0.1, axis=0)
+    high = np.percentile(coords, 99.9, axis=0)
+    span = np.where(high > low, high - low, 1.0)
+    low, high = low - 0.05 * span, high + 0.05 * span
+
+    grid, outside = bin_coordinates(coords, clusters, n_clusters, low, high, gridsize)
+    return {
+        "components": pca.components_,
+        "mean": pca.mean_,
+        "explained_variance_ratio": pca.explained_variance_ratio_,
+        "extent": (low[0], high[0], low[1], high[1]),
+        "gridsize": gridsize,
+        "grid": grid,
+        "outside": outside,
+    }
+
+def bin_coordinates(coords, clusters, n_clusters, low, high, gridsize):
+    """Count customers per (cluster, y-bin, x-bin) in a single bincount pass
+
+    Customers outside the extent are left out of the grid rather than piled
+    into the border cells; how many were left out is returned alongside.
+    """
+    scale = gridsize / (high - low)
+    bins = np.floor((coords - low) * scale).astype(np.int64)
+    inside = ((bins >= 0) & (bins < gridsize)).all(axis=1)
+    bins = bins[inside]
+    clusters = np.asarray(clusters, dtype=np.int64)[inside]
+    flat = (clusters * gridsize + bins[:, 1]) * gridsize + bins[:, 0]
+    counts = np.bincount(flat, minlength=n_clusters * gridsize * gridsize)
+    return counts.reshape(n_clusters, gridsize, gridsize), int((~inside).sum())
+
+def project(X_scaled, projection):
+    """Project scaled feature rows onto the stored PCA components"""
+    return (np.asarray(X_scaled) - projection["mean"]) @ projection["components"].T
+
+# =================================================
+# RENDERING
+# =================================================
+def rasterize(projection):
+    """Turn the binned counts into an RGBA image: dominant cluster hue, log-density alpha"""
+    grid = projection["grid"]
+    n_clusters = grid.shape[0]
+    totals = grid.sum(axis=0)
+    dominant = grid.argmax(axis=0)
+
+    palette = np.array([to_rgb(CLUSTER_COLORS[i % len(CLUSTER_COLORS)])
+                        for i in range(n_clusters)])
+    image = np.zeros(totals.shape + (4,))
+    image[..., :3] = palette[dominant]
+    if totals.max() > 0:
+        density = np.log1p(totals) / np.log1p(totals.max())
+        image[..., 3] = np.where(totals > 0, 0.25 + 0.75 * density, 0.0)
+    return image
+
+def plot_projection(projection, highlight=None, highlight_cluster=None):
+    """Draw the binned cluster map, optionally marking a single projected customer"""
+    fig, ax = plt.subplots(figsize=(10, 7))
+    ax.imshow(rasterize(projection), origin='lower', extent=projection["extent"],
+              aspect='auto', interpolation='nearest')
+
+    if highlight is not None:
+        ax.scatter([highlight[0]], [highlight[1]], marker='*', s=400,
+                   color='#ffd700', edgecolor='black', linewidth=1.5, zorder=3,
+                   label=f'Your Customer (Cluster {highlight_cluster})')
+
+    n_clusters = projection["grid"].shape[0]
+    handles = [Patch(color=CLUSTER_COLORS[i % len(CLUSTER_COLORS)], label=f'Cluster {i}')
+               for i in range(n_clusters)]
+    if highlight is not None:
+        handles.append(ax.collections[-1])
+    ax.legend(handles=handles, loc='upper right', fontsize=9)
+
+    variance = projection["explained_variance_ratio"]
+    ax.set_xlabel(f"PC1 ({variance[0]:.0%} variance)", fontsize=12)
+    ax.set_ylabel(f"PC2 ({variance[1]:.0%} variance)", fontsize=12)
+    ax.set_title("Customer Clusters (PCA Projection)", fontsize=14, fontweight='bold')
+    ax.grid(True, alpha=0.3)
+    return fig
@@ -0,0 +1,148 @@
+"""
+Bootstrap Cluster Stability
+Refits the clustering engine on many bootstrap resamples in a process pool
+(workers read the scaled matrix from shared memory) and measures:
+- per-cluster Jaccard stability (Hennig's clusterboot)
+- per-customer assignment confidence (share of refits that agree)
+Results are cached on disk per model version.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from threadpoolctl import threadpool_limits
+
+from clustering_engines import DEFAULT_ENGINE, fit_engine
+
+STABILITY_CACHE_DIR = "stability_cache"
+N_BOOTSTRAP = 50
+MAX_SAMPLE_SIZE = 100_000
+
+# =================================================
+# WORKER
+# =================================================
+_shared = {}
+
+def _attach_shared(name, shape, dtype):
+    """Process-pool initializer: map the scaled matrix and reference labels from shared memory"""
+    shm = shared_memory.SharedMemory(name=name)
+    X = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    labels = np.ndarray((shape[0],), dtype=np.int64, buffer=shm.buf, offset=X.nbytes)
+    _shared.update(shm=shm, X=X, labels=labels)
+
+def contingency(labels_a, labels_b, n_a, n_b):
+    """Counts of rows in (cluster a, cluster b) pairs"""
+    flat = labels_a.astype(np.int64) * n_b + labels_b
+    return np.bincount(flat, minlength=n_a * n_b).reshape(n_a, n_b)
+
+def bootstrap_fit(seed, n_clusters, engine, sample_size):
+    """One bootstrap refit: Jaccard per reference cluster and packed per-customer agreement"""
+    X, reference = _shared["X"], _shared["labels"]
+    rng = np.random.default_rng(seed)
+    idx = rng.integers(0, len(X), size=sample_size)
+
+    with threadpool_limits(limits=1):
+        result = fit_engine(engine, X[idx], n_clusters=n_clusters, random_state=seed)
+        labels_all = result["model"].predict(X)
+
+    # Jaccard between each reference cluster and its best-matching refit cluster,
+    # measured on the distinct resampled customers (as in clusterboot), so rows
+    # drawn more than once are not counted more than once
+    distinct = np.unique(idx)
+    overlap = contingency(reference[distinct], labels_all[distinct], n_clusters, n_clusters)
+    union = overlap.sum(axis=1)[:, None] + overlap.sum(axis=0)[None, :] - overlap
+    jaccard = np.where(union > 0, overlap / np.maximum(union, 1), 0.0).max(axis=1)
+
+    # Relabel refit clusters to reference ids, then check every customer
+    rows, cols = linear_sum_assignment(-overlap)
+    to_reference = np.empty(n_clusters, dtype=np.int64)
+    to_reference[cols] = rows
+    agree = to_reference[labels_all] == reference
+    return jaccard, np.packbits(agree)
+
+# =================================================
+# ANALYSIS
+# =================================================
+def run_stability_analysis(X_scaled, labels, n_clusters, engine=DEFAULT_ENGINE,
+                           n_bootstrap=N_BOOTSTRAP, max_sample_size=MAX_SAMPLE_SIZE,
+                           max_workers=None, random_state=42):
+    """Bootstrap the clustering and return (jaccard per cluster, confidence per customer)"""
+    X_scaled = np.ascontiguousarray(X_scaled, dtype=np.float64)
+    labels = np.ascontiguousarray(labels, dtype=np.int64)
+    n_rows = len(X_scaled)
+    # m-out-of-n bootstrap keeps each refit bounded on very large datasets
+    sample_size = min(n_rows, max_sample_size)
+
+    shm = shared_memory.SharedMemory(create=True, size=X_scaled.nbytes + labels.nbytes)
+    try:
+        np.ndarray(X_scaled.shape, dtype=X_scaled.dtype, buffer=shm.buf)[:] = X_scaled
+        np.ndarray(labels.shape, dtype=labels.dtype, buffer=shm.buf,
+                   offset=X_scaled.nbytes)[:] = labels
+
+        jaccard_sum = np.zeros(n_clusters)
+        agree_count = np.zeros(n_rows, dtype=np.int32)
+        seeds = np.random.default_rng(random_state).integers(0, 2**31 - 1, size=n_bootstrap)
+        workers = min(n_bootstrap, max_workers or os.cpu_count() or 1)
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach_shared,
+                                 initargs=(shm.name, X_scaled.shape, X_scaled.dtype)) as executor:
+            futures = [executor.submit(bootstrap_fit, int(seed), n_clusters, engine, sample_size)
+                       for seed in seeds]
+            for future in futures:
+                jaccard, packed = future.result()
+                jaccard_sum += jaccard
+                agree_count += np.unpackbits(packed, count=n_rows)
+    finally:
+        shm.close()
+        shm.unlink()
+
+    return jaccard_sum / n_bootstrap, (agree_count / n_bootstrap).astype(np.float32)
+
+def stability_label(jaccard):
+    """Hennig's rule of thumb for clusterboot Jaccard values"""
+    if jaccard >= 0.85:
+        return "Highly Stable"
+    if jaccard >= 0.75:
+        return "Stable"
+    if jaccard >= 0.6:
+        return "Weak"
+    return "Unstable"
+
+# =================================================
+# CACHE
+# =================================================
+def cache_path(model_version, n_bootstrap=N_BOOTSTRAP, cache_dir=STABILITY_CACHE_DIR):
+    return os.path.join(cache_dir, f"{model_version}_{n_bootstrap}.npz")
+
+def load_stability(model_version, n_bootstrap=N_BOOTSTRAP, cache_dir=STABILITY_CACHE_DIR):
+    """Cached (jaccard, confidence) for a model version, or None"""
+    path = cache_path(model_version, n_bootstrap, cache_dir)
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as data:
+            return data["jaccard"], data["confidence"]
+    except Exception:
+        return None
+
+def get_stability(model_version, X_scaled, labels, n_clusters, engine=DEFAULT_ENGINE,
+                  n_bootstrap=N_BOOTSTRAP, cache_dir=STABILITY_CACHE_DIR, **kwargs):
+    """Load stability results for a model version, running the analysis on a cache miss"""
+    try:
+        cached = load_stability(model_version, n_bootstrap, cache_dir)
+        if cached is not None:
+            return cached, None
+
+        jaccard, confidence = run_stability_analysis(X_scaled, labels, n_clusters, engine,
+                                                     n_bootstrap=n_bootstrap, **kwargs)
+        os.makedirs(cache_dir, exist_ok=True)
+        path = cache_path(model_version, n_bootstrap, cache_dir)
+        tmp_path = path + ".tmp.npz"
+        np.savez(tmp_path, jaccard=jaccard, confidence=confidence)
+        os.replace(tmp_path, path)
+        return (jaccard, confidence), None
+    except Exception as e:
+        return None, f"Error running stability analysis: {str(e)}"
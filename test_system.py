@@ -105,6 +105,353 @@ def test_model_training():
         print(f"❌ Model training error: {e}")
         return False
 
+def test_projection():
+    """Test PCA projection and binned cluster map"""
+    print("\n🗺️ Testing cluster projection...")
+    try:
+        import numpy as np
+        from projection import fit_projection, project, rasterize
+        
+        rng = np.random.default_rng(42)
+        X_scaled = rng.normal(size=(5000, 7))
+        clusters = rng.integers(0, 6, size=5000)
+        
+        projection = fit_projection(X_scaled, clusters, 6, gridsize=50)
+        grid = projection["grid"]
+        
+        if grid.shape != (6, 50, 50) or grid.sum() + projection["outside"] != len(X_scaled):
+            print(f"❌ Binned grid does not account for all customers: {grid.shape}, {grid.sum()}")
+            return False
+        
+        # Far outliers are left out of the grid instead of piled onto its border
+        outliers = np.vstack([X_scaled, np.full((3, 7), 50.0)])
+        projection = fit_projection(outliers, np.append(clusters, [0] * 3), 6, gridsize=50)
+        binned = projection["grid"].sum() + projection["outside"]
+        if projection["outside"] < 3 or binned != len(outliers):
+            print(f"❌ Outliers were clamped into border cells: {projection['outside']}")
+            return False
+        
+        coords = project(X_scaled[:1], projection)
+        if coords.shape != (1, 2):
+            print(f"❌ Unexpected projected shape: {coords.shape}")
+            return False
+        
+        if rasterize(projection).shape != (50, 50, 4):
+            print("❌ Rasterized image has the wrong shape")
+            return False
+        
+        print("✅ Projection fitted and binned successfully")
+        print(f"   - Customers binned: {grid.sum():,}")
+        print(f"   - Outside the map extent: {projection['outside']:,}")
+        print(f"   - Grid cells: {grid.shape[1] * grid.shape[2]:,}")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Projection error: {e}")
+        return False
+
+def test_cohorts():
+    """Test per-window cohort training and window cache"""
+    print("\n📅 Testing cohort segmentation...")
+    try:
+        import tempfile
+        import pandas as pd
+        from cohorts import train_cohort_models, compare_cohorts, small_windows, assign_cohorts
+        
+        df = pd.read_csv('customer_segmentation.csv')
+        df.dropna(inplace=True)
+        df["Age"] = 2026 - df["Year_Birth"]
+        df["Total_Spending"] = df[["MntWines", "MntFruits", "MntMeatProducts",
+                                   "MntFishProducts", "MntSweetProducts", 
+                                   "MntGoldProds"]].sum(axis=1)
+        
+        features = ["Age", "Income", "Total_Spending",
+                   "NumWebPurchases", "NumStorePurchases",
+                   "NumWebVisitsMonth", "Recency"]
+        
+        with tempfile.TemporaryDirectory() as cache_dir:
+            results, error = train_cohort_models(df, features, freq="Y", cache_dir=cache_dir)
+            if error:
+                print(f"❌ {error}")
+                return False
+            
+            # Drop the newest customers: only the newest window should retrain
+            newest = list(results)[-1]
+            df_dates = pd.to_datetime(df["Dt_Customer"], format="%d-%m-%Y")
+            trimmed = df[df_dates < df_dates.max()]
+            results, error = train_cohort_models(trimmed, features, freq="Y", cache_dir=cache_dir)
+            retrained = [w for w, entry in results.items() if not entry["from_cache"]]
+            if retrained != [newest]:
+                print(f"❌ Expected only {newest} to retrain, got {retrained}")
+                return False
+            
+            # A different cluster count must not reuse the 6-cluster models
+            results_k4, error = train_cohort_models(trimmed, features, freq="Y", n_clusters=4,
+                                                    cache_dir=cache_dir)
+            if any(entry["from_cache"] or entry["model"].n_clusters != 4
+                   for entry in results_k4.values()):
+                print("❌ Cached models were reused for a different number of clusters")
+                return False
+            
+            # A newest quarter too small to model is reported, not silently dropped
+            quarters = assign_cohorts(df, "Q")
+            newest_quarter = quarters.max()
+            sparse = pd.concat([df[quarters != newest_quarter],
+                                df[quarters == newest_quarter].head(5)])
+            skipped = small_windows(sparse, "Q")
+            results_q, error = train_cohort_models(sparse, features, freq="Q",
+                                                   cache_dir=cache_dir)
+            if list(skipped.index) != [newest_quarter] or newest_quarter in results_q:
+                print(f"❌ Expected only {newest_quarter} to be skipped, got {list(skipped.index)}")
+                return False
+        
+        comparison = compare_cohorts(results, features)
+        print("✅ Cohort models trained successfully")
+        print(f"   - Windows: {len(results)}")
+        print(f"   - Summary rows: {len(comparison)}")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Cohort segmentation error: {e}")
+        return False
+
+def test_drift_monitor():
+    """Test streaming sketches and drift alerts"""
+    print("\n🛰️ Testing drift monitor...")
+    try:
+        import numpy as np
+        from drift_monitor import DriftMonitor, QuantileSketch
+        
+        rng = np.random.default_rng(42)
+        
+        # Quantile sketch stays small and accurate on a large stream
+        sketch = QuantileSketch()
+        values = rng.normal(size=1_000_000)
+        for chunk in np.array_split(values, 100):
+            sketch.update(chunk)
+        error = abs(sketch.quantile(0.9) - np.quantile(values, 0.9))
+        if sketch.size > 2000 or error > 0.05:
+            print(f"❌ Sketch too large or inaccurate: size={sketch.size}, error={error:.3f}")
+            return False
+        
+        features = ["Age", "Income", "Recency"]
+        monitor = DriftMonitor.from_training(rng.normal(size=(20000, 3)),
+                                             rng.integers(0, 6, 20000), features, 6)
+        
+        monitor.observe(rng.normal(size=(1000, 3)), rng.integers(0, 6, 1000))
+        if monitor.alerts():
+            print(f"❌ Unexpected alerts on undrifted data: {monitor.alerts()}")
+            return False
+        
+        monitor.reset()
+        monitor.observe(rng.normal(loc=1.0, size=(1000, 3)), rng.integers(0, 2, 1000))
+        if len(monitor.alerts()) != len(features) + 1:
+            print(f"❌ Expected drift alerts, got: {monitor.alerts()}")
+            return False
+        
+        print("✅ Drift monitor working")
+        print(f"   - Sketch size for 1M values: {sketch.size}")
+        print(f"   - Alerts on shifted data: {len(monitor.alerts())}")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Drift monitor error: {e}")
+        return False
+
+def test_audit_log():
+    """Test buffered audit log writes, rotation and aggregation"""
+    print("\n🧾 Testing prediction audit log...")
+    try:
+        import time
+        import tempfile
+        import threading
+        from audit_log import AuditLog, aggregate_predictions, log_files, predictions_per_user
+        
+        features = ["Age", "Income"]
+        with tempfile.TemporaryDirectory() as log_dir:
+            audit_log = AuditLog(features, log_dir=log_dir, max_bytes=4096, flush_interval=0.1)
+            for i in range(1000):
+                audit_log.log_prediction(f"user{i % 4}", "test-model",
+                                         {"Age": 30 + i % 10, "Income": 50000}, i % 6)
+            audit_log.close()
+            
+            totals = aggregate_predictions(log_dir)
+            if totals["predictions"].sum() != 1000:
+                print(f"❌ Expected 1000 logged predictions, got {totals['predictions'].sum()}")
+                return False
+            
+            if len(log_files(log_dir)) < 2:
+                print("❌ Log file was not rotated")
+                return False
+        
+        # Usernames that look like missing values are still users
+        with tempfile.TemporaryDirectory() as log_dir:
+            audit_log = AuditLog(features, log_dir=log_dir, flush_interval=0.1)
+            for user in ["alice", "null", "None", "NaN", "N/A"]:
+                audit_log.log_prediction(user, "test-model", {"Age": 30, "Income": 50000}, 1)
+            audit_log.close()
+            
+            per_user = predictions_per_user(aggregate_predictions(log_dir))
+            if len(per_user) != 5 or per_user.sum() != 5:
+                print(f"❌ NA-like usernames were dropped: {per_user.to_dict()}")
+                return False
+        
+        # Failed writes are retried, and flush() waits for them
+        with tempfile.TemporaryDirectory() as log_dir:
+            audit_log = AuditLog(features, log_dir=log_dir, flush_interval=0.1, retry_delay=0.05)
+            write = audit_log._write
+            failures = [OSError("disk full"), OSError("disk full")]
+            
+            def flaky_write(records):
+                if failures:
+                    raise failures.pop()
+                write(records)
+            
+            audit_log._write = flaky_write
+            audit_log.log_prediction("alice", "test-model", {"Age": 30, "Income": 50000}, 2)
+            if not audit_log.flush(timeout=5) or audit_log.last_error:
+                print("❌ Audit log did not recover from failed writes")
+                return False
+            audit_log.close()
+            if aggregate_predictions(log_dir)["predictions"].sum() != 1:
+                print("❌ Record lost after a failed write")
+                return False
+        
+        # Records that can't be written at shutdown go to a fallback file
+        with tempfile.TemporaryDirectory() as log_dir:
+            audit_log = AuditLog(features, log_dir=log_dir, flush_interval=0.1, retry_delay=0.01)
+            
+            def broken_write(records):
+                raise OSError("disk full")
+            
+            audit_log._write = broken_write
+            for i in range(3):
+                audit_log.log_prediction("bob", "test-model", {"Age": 30, "Income": 50000}, i)
+            if audit_log.flush(timeout=0.3):
+                print("❌ flush() reported unwritten records as written")
+                return False
+            audit_log.close()
+            if aggregate_predictions(log_dir)["predictions"].sum() != 3:
+                print("❌ Unwritten records were lost on shutdown")
+                return False
+            
+        # Predictions racing close() are either written or rejected, never lost
+        with tempfile.TemporaryDirectory() as log_dir:
+            audit_log = AuditLog(features, log_dir=log_dir, flush_interval=0.01)
+            accepted = []
+            
+            def log_until_closed():
+                try:
+                    while True:
+                        audit_log.log_prediction("carol", "test-model",
+                                                 {"Age": 30, "Income": 50000}, 0)
+                        accepted.append(1)
+                except RuntimeError:
+                    pass
+            
+            threads = [threading.Thread(target=log_until_closed) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            time.sleep(0.05)
+            audit_log.close()
+            for thread in threads:
+                thread.join()
+            if not audit_log.flush(timeout=5):
+                print("❌ Records enqueued after close() were never written")
+                return False
+            if aggregate_predictions(log_dir)["predictions"].sum() != len(accepted):
+                print("❌ Accepted predictions were lost on close()")
+                return False
+            
+        print("✅ Audit log working")
+        print(f"   - Users: {len(predictions_per_user(totals))}")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Audit log error: {e}")
+        return False
+
+def test_clustering_engines():
+    """Test every clustering engine fits and reports its metrics"""
+    print("\n⚙️ Testing clustering engines...")
+    try:
+        import numpy as np
+        from clustering_engines import CLUSTERING_ENGINES, benchmark_engines, fit_engine
+        
+        rng = np.random.default_rng(42)
+        X_scaled = np.vstack([rng.normal(5 * center, 0.5, size=(500, 7)) for center in range(6)])
+        
+        report = benchmark_engines(X_scaled)
+        if len(report) != len(CLUSTERING_ENGINES) or report["Inertia vs Best"].max() > 0.05:
+            print(f"❌ Engine quality out of range:\n{report}")
+            return False
+        
+        # Bisecting counts iterations through a private sklearn hook: fail if it stops firing
+        if report["Total Iterations"].isna().any():
+            print(f"❌ Some engines did not report iterations:\n{report}")
+            return False
+        
+        # Restarts run by hand must give the same model as KMeans(n_init=10)
+        from sklearn.cluster import KMeans
+        result = fit_engine("kmeans", X_scaled)
+        reference = KMeans(n_clusters=6, random_state=42, n_init=10).fit(X_scaled)
+        if (not np.array_equal(result["labels"], reference.labels_)
+                or result["n_iter"] < reference.n_iter_):
+            print("❌ kmeans engine no longer matches KMeans(n_init=10)")
+            return False
+        
+        # Models fitted on float32 must score both float64 and float32 rows
+        for engine in ["elkan_float32", "sampled_kmeans++", "kmeans||"]:
+            model = fit_engine(engine, X_scaled)["model"]
+            model.predict(X_scaled[:5])
+            model.predict(X_scaled[:5].astype(np.float32))
+        
+        print("✅ All clustering engines working")
+        print(f"   - Engines: {', '.join(report['Engine'])}")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Clustering engine error: {e}")
+        return False
+
+def test_stability():
+    """Test bootstrap stability analysis and its cache"""
+    print("\n🧪 Testing cluster stability analysis...")
+    try:
+        import tempfile
+        import numpy as np
+        from clustering_engines import fit_engine
+        from stability import get_stability, load_stability
+        
+        rng = np.random.default_rng(42)
+        X_scaled = np.vstack([rng.normal(5 * center, 0.5, size=(300, 7)) for center in range(6)])
+        labels = fit_engine("kmeans", X_scaled)["labels"]
+        
+        with tempfile.TemporaryDirectory() as cache_dir:
+            result, error = get_stability("test-model", X_scaled, labels, 6,
+                                          n_bootstrap=8, cache_dir=cache_dir, max_workers=2)
+            if error:
+                print(f"❌ {error}")
+                return False
+            
+            jaccard, confidence = result
+            if jaccard.min() < 0.9 or confidence.mean() < 0.9:
+                print(f"❌ Well-separated clusters look unstable: {jaccard}")
+                return False
+            
+            if load_stability("test-model", n_bootstrap=8, cache_dir=cache_dir) is None:
+                print("❌ Stability results were not cached")
+                return False
+        
+        print("✅ Stability analysis working")
+        print(f"   - Min cluster Jaccard: {jaccard.min():.2f}")
+        print(f"   - Mean customer confidence: {confidence.mean():.2f}")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Stability analysis error: {e}")
+        return False
+
 def test_user_database():
     """Test user database functionality"""
     print("\n👤 Testing user database...")
@@ -151,6 +498,12 @@ def run_all_tests():
         ("Package Imports", test_imports),
         ("Dataset", test_dataset),
         ("Model Training", test_model_training),
+        ("Cluster Projection", test_projection),
+        ("Cohort Segmentation", test_cohorts),
+        ("Drift Monitor", test_drift_monitor),
+        ("Audit Log", test_audit_log),
+        ("Clustering Engines", test_clustering_engines),
+        ("Cluster Stability", test_stability),
         ("User Database", test_user_database),
         ("Application File", test_app_file)
     ]